@@ -1,41 +1,99 @@
 from __future__ import annotations
 
-import json
+import hashlib
+import hmac
+import os
 import re
 from functools import wraps
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
 
+import orjson
 from flask import (
     Flask,
+    Response,
     abort,
+    g,
     jsonify,
     redirect,
     render_template,
     request,
-    session,
     url_for,
 )
 
-from problems import list_problems, get_problem
+from problems import PROBLEMS, PROBLEMS_JSON_HTMLSAFE, get_problem, list_problems
 import grader
 
 
+def _json_response(obj: Any) -> Response:
+    try:
+        body = orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        # orjson rejects e.g. integers beyond 64 bits, which the stdlib encoder handles
+        return jsonify(obj)
+    return Response(body, mimetype="application/json")
+
+
 def create_app() -> Flask:
     app = Flask(__name__)
 
     # Basic config (adjust as needed)
     app.config["SECRET_KEY"] = "dev-secret-change-me"
+    # Request body cap (bytes); submissions are small
+    app.config["MAX_CONTENT_LENGTH"] = 64 * 1024
 
     # Login policy: either whitelist or pattern (or both)
     # If ALLOWED_IDS is non-empty, it is enforced; otherwise ID_PATTERN is used
     app.config["ALLOWED_IDS"] = {"65001", "65002", "65003"}
     app.config["ID_PATTERN"] = r"^\d{5,10}$"
+    pattern = app.config["ID_PATTERN"]
+    app.config["_ID_PATTERN_RE"] = re.compile(pattern) if pattern else None
+
+    # Grading sandbox: warm worker processes (0 forks a fresh process per run)
+    app.config["GRADER_WORKERS"] = os.cpu_count() or 1
+    app.config["GRADER_TIME_LIMIT"] = 2.0
+    app.config["GRADER_MEM_LIMIT_MB"] = 128
+    # Max submissions per /api/run "code_batch" request, and the wall-clock
+    # budget (seconds) after which no further submission in it is started
+    app.config["GRADER_MAX_BATCH"] = 100
+    app.config["GRADER_BATCH_TIME_LIMIT"] = 10.0
+    # Student IDs allowed to send "code_batch" requests (empty disables batches)
+    app.config["INSTRUCTOR_IDS"] = set()
+    # Encoded /api/run responses kept for identical re-submissions, bounded both
+    # by count and by their total size in bytes; larger bodies are never kept
+    app.config["GRADER_RESULT_CACHE_SIZE"] = 4096
+    app.config["GRADER_RESULT_CACHE_BYTES"] = 32 * 1024 * 1024
+    app.config["GRADER_RESULT_CACHE_MAX_BODY"] = 256 * 1024
+    # Workers are only forked once the first submission is graded
+    if app.config["GRADER_WORKERS"] > 0:
+        grader.configure_pool(
+            app.config["GRADER_WORKERS"],
+            mem_limit_mb=app.config["GRADER_MEM_LIMIT_MB"],
+            problems=PROBLEMS,
+        )
+
+    # Login state is one signed cookie "<student_id>.<mac>" (keyed BLAKE2s) rather
+    # than a serialized Flask session
+    app.config["AUTH_COOKIE_NAME"] = "sid"
+    mac_key = hashlib.blake2s(app.config["SECRET_KEY"].encode()).digest()
+
+    def student_mac(student_id: str) -> str:
+        return hashlib.blake2s(student_id.encode(), key=mac_key, digest_size=16).hexdigest()
+
+    def current_student_id() -> Optional[str]:
+        student_id, _, mac = request.cookies.get(app.config["AUTH_COOKIE_NAME"], "").rpartition(".")
+        # compare_digest raises TypeError on non-ASCII str, so such MACs are rejected first
+        if student_id and mac.isascii() and hmac.compare_digest(mac, student_mac(student_id)):
+            return student_id
+        return None
 
     def login_required(fn):
         @wraps(fn)
         def wrapper(*args, **kwargs):
-            if "student_id" not in session:
-                return redirect(url_for("login", next=request.path))
+            g.student_id = current_student_id()
+            if g.student_id is None:
+                query = urlencode({"next": request.path}, safe="/")
+                return redirect(f"{request.script_root}{login_path}?{query}")
             return fn(*args, **kwargs)
 
         return wrapper
@@ -45,49 +103,107 @@ def create_app() -> Flask:
         error = request.args.get("error")
         return render_template("login.html", error=error)
 
+    # Resolved once; the decorator only prepends the per-request script root
+    with app.test_request_context():
+        login_path = url_for("login")
+
     @app.post("/login")
     def do_login():
         student_id = (request.form.get("student_id") or "").strip()
-        allowed_ids = app.config.get("ALLOWED_IDS") or set()
-        pattern = app.config.get("ID_PATTERN")
+        allowed_ids = app.config.get("ALLOWED_IDS")
 
         ok = False
         if allowed_ids:
             ok = student_id in allowed_ids
-        elif pattern:
-            ok = re.match(pattern, student_id) is not None
+        else:
+            pattern_re = app.config.get("_ID_PATTERN_RE")
+            ok = pattern_re is not None and pattern_re.match(student_id) is not None
 
         if not ok:
             return redirect(url_for("login", error="Invalid ID"))
 
-        session["student_id"] = student_id
-        return redirect(url_for("index"))
+        resp = redirect(url_for("index"))
+        # Same cookie attributes as Flask's session cookie
+        resp.set_cookie(
+            app.config["AUTH_COOKIE_NAME"],
+            f"{student_id}.{student_mac(student_id)}",
+            httponly=app.config["SESSION_COOKIE_HTTPONLY"],
+            secure=app.config["SESSION_COOKIE_SECURE"],
+            samesite=app.config["SESSION_COOKIE_SAMESITE"],
+        )
+        return resp
 
     @app.get("/logout")
     def logout():
-        session.clear()
-        return redirect(url_for("login"))
+        resp = redirect(url_for("login"))
+        resp.delete_cookie(app.config["AUTH_COOKIE_NAME"])
+        return resp
 
     @app.get("/")
     @login_required
     def index():
-        problems = list_problems()
         # Embed problems into the page for simple client-side switching
         return render_template(
             "index.html",
-            problems=problems,
-            problems_json=json.dumps(problems),
-            student_id=session.get("student_id"),
+            problems=list_problems(),
+            problems_json=PROBLEMS_JSON_HTMLSAFE,
+            student_id=g.student_id,
+        )
+
+    result_cache = grader.LRUCache(
+        maxsize=app.config["GRADER_RESULT_CACHE_SIZE"],
+        maxbytes=app.config["GRADER_RESULT_CACHE_BYTES"],
+    )
+
+    def run_batch(batch: Any) -> List[Dict[str, Any]]:
+        if g.student_id not in app.config["INSTRUCTOR_IDS"]:
+            abort(403, description="code_batch is limited to instructors")
+        if not isinstance(batch, list) or not 0 < len(batch) <= app.config["GRADER_MAX_BATCH"]:
+            abort(400, description="Invalid code_batch")
+
+        results: List[Optional[Dict[str, Any]]] = []
+        jobs: List[grader.Job] = []
+        for entry in batch:
+            problem_id = entry.get("problem_id") if isinstance(entry, dict) else None
+            code = entry.get("code") if isinstance(entry, dict) else None
+            if not isinstance(problem_id, str) or not isinstance(code, str):
+                abort(400, description="Missing or invalid fields")
+            problem = get_problem(problem_id)
+            if problem:
+                jobs.append((problem, code))
+                results.append(None)
+            else:
+                results.append({"status": "error", "error": "Problem not found"})
+
+        # Jobs are graded concurrently, each on its own pre-forked worker
+        graded = iter(
+            grader.run_batch_in_subprocess(
+                jobs,
+                time_limit=app.config["GRADER_TIME_LIMIT"],
+                mem_limit_mb=app.config["GRADER_MEM_LIMIT_MB"],
+                batch_time_limit=app.config["GRADER_BATCH_TIME_LIMIT"],
+            )
         )
+        return [r if r is not None else next(graded) for r in results]
 
     @app.post("/api/run")
     @login_required
     def api_run():
+        if not request.is_json:
+            abort(415, description="Expected application/json")
+        raw = request.get_data(cache=False)
+        if len(raw) > app.config["MAX_CONTENT_LENGTH"]:
+            abort(413)
         try:
-            payload: Dict[str, Any] = request.get_json(force=True)
-        except Exception:
+            payload: Dict[str, Any] = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            abort(400, description="Invalid JSON")
+        if not isinstance(payload, dict):
             abort(400, description="Invalid JSON")
 
+        if "code_batch" in payload:
+            return _json_response({"results": run_batch(payload["code_batch"])})
+
         problem_id = payload.get("problem_id")
         code = payload.get("code")
         if not isinstance(problem_id, str) or not isinstance(code, str):
@@ -97,10 +213,27 @@ def create_app() -> Flask:
         if not problem:
             abort(404, description="Problem not found")
 
+        # Identical re-submissions are answered from the encoded response body
+        key = (problem_id, problem["_version"], grader.source_key(code))
+        body = result_cache.get(key)
+        if body is not None:
+            return Response(body, mimetype="application/json")
+
         # Grade in an isolated process
-        result = grader.run_in_subprocess(problem, code, time_limit=2.0, mem_limit_mb=128)
+        result = grader.run_in_subprocess(
+            problem,
+            code,
+            time_limit=app.config["GRADER_TIME_LIMIT"],
+            mem_limit_mb=app.config["GRADER_MEM_LIMIT_MB"],
+        )
 
-        return jsonify(result)
+        resp = _json_response(result)
+        # Timeouts and crashed sandboxes depend on load, so only completed runs are kept
+        if result["status"] == "ok":
+            body = resp.get_data()
+            if len(body) <= app.config["GRADER_RESULT_CACHE_MAX_BODY"]:
+                result_cache.put(key, body)
+        return resp
 
     return app
 
@@ -1,16 +1,28 @@
 from __future__ import annotations
 
 import ast
+import atexit
+import marshal
 import multiprocessing as mp
+import os
+import pickle
 import queue
 import resource
+import signal
 import sys
+import threading
 import time
-from typing import Any, Dict, List
+import weakref
+from collections import OrderedDict
+from multiprocessing.connection import Connection, wait
+from types import CodeType, MappingProxyType
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, Union
 
+import xxhash
 
-# Strict but useful builtins whitelist
-SAFE_BUILTINS = {
+
+# Strict but useful builtins whitelist (read-only; jobs get their own dict copy)
+SAFE_BUILTINS = MappingProxyType({
     "abs": abs,
     "all": all,
     "any": any,
@@ -56,30 +68,156 @@ SAFE_BUILTINS = {
     "sum": sum,
     "tuple": tuple,
     "zip": zip,
-}
+})
 
 
 class SecurityError(Exception):
     pass
 
 
-def _ensure_safe(code: str) -> None:
-    """Parse AST to block imports and other obviously unsafe constructs."""
+# A submission to grade: (problem, code)
+Job = Tuple[Dict[str, Any], str]
+# The same once the parent has checked and compiled the code
+_Compiled = Tuple[Dict[str, Any], CodeType]
+
+
+# Sandboxes are forked from request threads, and another thread may hold a cache
+# lock at that moment; the child gets fresh locks so its lookups cannot deadlock
+_LIVE_CACHES: "weakref.WeakSet[LRUCache]" = weakref.WeakSet()
+
+
+def _reset_cache_locks() -> None:
+    for cache in _LIVE_CACHES:
+        cache._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_cache_locks)
+
+
+class LRUCache:
+    """Small thread-safe LRU mapping used for the grader's memo caches.
+
+    With ``maxbytes`` set, values must support ``len()`` (e.g. encoded response
+    bodies) and the cache also keeps their total length within that bound;
+    a value longer than ``maxbytes`` on its own is not stored.
+    """
+
+    def __init__(self, maxsize: int, maxbytes: Optional[int] = None) -> None:
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        _LIVE_CACHES.add(self)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxbytes is None:
+            with self._lock:
+                self._data[key] = value
+                self._data.move_to_end(key)
+                if len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+            return
+
+        size = len(value)
+        if size > self.maxbytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._nbytes -= len(old)
+            self._data[key] = value
+            self._nbytes += size
+            while len(self._data) > self.maxsize or self._nbytes > self.maxbytes:
+                self._nbytes -= len(self._data.popitem(last=False)[1])
+
+
+# Checked submissions keyed by source digest: the compiled code object, or the
+# SecurityError message for rejected code
+_SAFETY_CACHE = LRUCache(maxsize=512)
+
+
+def source_key(code: str) -> int:
+    # Non-cryptographic is enough: a colliding key can only ever return code or a
+    # result that was itself produced by a full check and grading run
+    return xxhash.xxh3_64_intdigest(code.encode())
+
+
+_FORBIDDEN_NAMES = frozenset({"__import__", "eval", "exec", "open"})
+
+
+def _reject_import(node: ast.AST) -> None:
+    raise SecurityError("Import statements are not allowed")
+
+
+def _check_attribute(node: ast.Attribute) -> None:
+    # Prevent dunder traversal like obj.__class__/__subclasses__ hacks
+    if node.attr.startswith("__"):
+        raise SecurityError("Access to dunder attributes is not allowed")
+
+
+def _check_name(node: ast.Name) -> None:
+    if node.id in _FORBIDDEN_NAMES:
+        raise SecurityError(f"Usage of '{node.id}' is not allowed")
+
+
+# Only these node types are inspected; everything else is just traversed
+_CHECKS: Dict[type, Callable[[Any], None]] = {
+    ast.Import: _reject_import,
+    ast.ImportFrom: _reject_import,
+    ast.Attribute: _check_attribute,
+    ast.Name: _check_name,
+}
+
+
+def _check_tree(tree: ast.AST) -> None:
+    # Explicit list-as-stack: no deque churn as in ast.walk and no recursion
+    # limit on deeply nested code as with ast.NodeVisitor
+    checks = _CHECKS
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        check = checks.get(type(node))
+        if check is not None:
+            check(node)
+        stack.extend(ast.iter_child_nodes(node))
+
+
+def _compile_checked(code: str) -> CodeType:
     try:
         tree = ast.parse(code, mode="exec")
+        _check_tree(tree)
+        # Compile the tree we already have so the source is only parsed once
+        return compile(tree, "<user>", "exec")
     except SyntaxError as e:
         raise SecurityError(f"SyntaxError: {e.msg} (line {e.lineno})")
 
-    for node in ast.walk(tree):
-        if isinstance(node, (ast.Import, ast.ImportFrom)):
-            raise SecurityError("Import statements are not allowed")
-        if isinstance(node, ast.Attribute):
-            # Prevent dunder traversal like obj.__class__/__subclasses__ hacks
-            if isinstance(node.attr, str) and node.attr.startswith("__"):
-                raise SecurityError("Access to dunder attributes is not allowed")
-        if isinstance(node, ast.Name):
-            if node.id in {"__import__", "eval", "exec", "open"}:
-                raise SecurityError(f"Usage of '{node.id}' is not allowed")
+
+def _ensure_safe(code: str) -> CodeType:
+    """Parse AST to block imports and other obviously unsafe constructs.
+
+    Returns the compiled code, memoized per source digest so re-submitting
+    unchanged code skips parsing, the tree walk and compilation entirely.
+    """
+    key = source_key(code)
+    checked = _SAFETY_CACHE.get(key)
+    if checked is None:
+        try:
+            checked = _compile_checked(code)
+        except SecurityError as se:
+            checked = str(se)
+        _SAFETY_CACHE.put(key, checked)
+    if isinstance(checked, str):
+        raise SecurityError(checked)
+    return checked
 
 
 def _limit_resources(mem_limit_mb: int) -> None:
@@ -98,15 +236,15 @@ def _limit_resources(mem_limit_mb: int) -> None:
         pass
 
 
-def _execute(problem: Dict[str, Any], code: str, mem_limit_mb: int, out_q: mp.Queue) -> None:
+def _grade(problem: Dict[str, Any], code_obj: CodeType) -> Dict[str, Any]:
+    # code_obj comes from _ensure_safe in the parent; it is not checked again here
     start = time.time()
     try:
-        _limit_resources(mem_limit_mb)
-        _ensure_safe(code)
-
-        # Prepare execution namespace with safe builtins only
-        ns: Dict[str, Any] = {"__builtins__": SAFE_BUILTINS}
-        exec(code, ns, ns)
+        # Prepare execution namespace with safe builtins only. A plain dict keeps
+        # the interpreter's fast builtin lookups, and being a copy the shared
+        # read-only template stays untouched.
+        ns: Dict[str, Any] = {"__builtins__": dict(SAFE_BUILTINS)}
+        exec(code_obj, ns, ns)
 
         fname = problem["function_name"]
         if fname not in ns:
@@ -118,6 +256,10 @@ def _execute(problem: Dict[str, Any], code: str, mem_limit_mb: int, out_q: mp.Qu
             args = t.get("args", [])
             kwargs = t.get("kwargs", {})
             expected = t.get("expected")
+            # Comparison tag from problems._add_problem: 0 ==, 1 any-of, 2 set lookup
+            cmp = t.get("_cmp")
+            if cmp is None:
+                cmp = 1 if isinstance(expected, list) else 0
             item: Dict[str, Any] = {
                 "index": idx,
                 "args": args,
@@ -126,18 +268,22 @@ def _execute(problem: Dict[str, Any], code: str, mem_limit_mb: int, out_q: mp.Qu
             }
             try:
                 got = fn(*args, **kwargs)
-                ok = False
-                if isinstance(expected, list):
-                    ok = any(got == e for e in expected)
-                else:
+                if cmp == 0:
                     ok = got == expected
+                elif cmp == 2 and not isinstance(got, tuple):
+                    try:
+                        ok = (tuple(got) if isinstance(got, list) else got) in t["_expected_set"]
+                    except TypeError:  # unhashable result, e.g. a list of lists
+                        ok = any(got == e for e in expected)
+                else:
+                    ok = any(got == e for e in expected)
                 item.update({"ok": bool(ok), "got": got, "error": None})
             except Exception as e:  # noqa: BLE001
                 item.update({"ok": False, "got": None, "error": f"ERROR: {type(e).__name__}: {e}"})
             tests.append(item)
 
         elapsed = time.time() - start
-        out_q.put({
+        return {
             "status": "ok",
             "tests": tests,
             "elapsed": round(elapsed, 4),
@@ -145,11 +291,343 @@ def _execute(problem: Dict[str, Any], code: str, mem_limit_mb: int, out_q: mp.Qu
                 "total": len(tests),
                 "passed": sum(1 for t in tests if t["ok"]),
             },
-        })
+        }
+    except SecurityError as se:
+        return {"status": "error", "error": str(se)}
+    except Exception as e:  # noqa: BLE001
+        return {"status": "error", "error": f"ERROR: {type(e).__name__}: {e}"}
+
+
+def _send_result(conn: Connection, result: Dict[str, Any]) -> None:
+    # One pickled blob per job: no feeder thread or locks as with mp.Queue
+    try:
+        blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as e:  # noqa: BLE001
+        # e.g. the function returned something that cannot be pickled
+        blob = pickle.dumps({"status": "error", "error": f"ERROR: {type(e).__name__}: {e}"})
+    conn.send_bytes(blob)
+
+
+def _recv_result(conn: Connection) -> Dict[str, Any]:
+    return pickle.loads(conn.recv_bytes())
+
+
+def _execute(problem: Dict[str, Any], code_obj: CodeType, mem_limit_mb: int, conn: Connection) -> None:
+    _limit_resources(mem_limit_mb)
+    _send_result(conn, _grade(problem, code_obj))
+    conn.close()
+
+
+def _worker_main(
+    jobs_in: Connection,
+    results_out: Connection,
+    problems: Dict[str, Dict[str, Any]],
+    mem_limit_mb: int,
+    parent: int,
+) -> None:
+    # Ctrl-C on the dev server is the parent's to handle; daemon workers die with it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _limit_resources(mem_limit_mb)
+    # Sibling workers inherit this pipe's write end, so a parent that dies without
+    # stopping the pool never closes it: watch for reparenting instead
+    while not jobs_in.poll(1.0):
+        if os.getppid() != parent:
+            return
+    try:
+        problem, code = jobs_in.recv()
+    except EOFError:
+        return
+    if isinstance(problem, str):
+        # Inherited through fork; the worker is discarded after this job, so code
+        # that mutates its arguments cannot affect anyone else's tests
+        problem = problems[problem]
+    _send_result(results_out, _grade(problem, marshal.loads(code)))
+
+
+# Workers are forked so they start with grader and the problem bank already loaded
+_FORK = mp.get_context("fork")
+
+
+class _Worker:
+    def __init__(self, mem_limit_mb: int, problems: Dict[str, Dict[str, Any]]) -> None:
+        # One single-producer/single-consumer pipe per direction: plain pipes are
+        # cheaper than the socketpair behind a duplex Pipe
+        jobs_in, self.jobs = _FORK.Pipe(duplex=False)
+        self.results, results_out = _FORK.Pipe(duplex=False)
+        self.proc = _FORK.Process(
+            target=_worker_main,
+            args=(jobs_in, results_out, problems, mem_limit_mb, os.getpid()),
+            daemon=True,
+        )
+        try:
+            self.proc.start()
+        except BaseException:
+            self.jobs.close()
+            self.results.close()
+            raise
+        finally:
+            jobs_in.close()
+            results_out.close()
+
+    def kill(self) -> None:
+        try:
+            self.proc.kill()
+        finally:
+            self.proc.join(0.1)
+            self.jobs.close()
+            self.results.close()
+
+
+_STOP: Any = object()
+# Longest pause between retries when forking a replacement worker keeps failing
+_MAX_RESPAWN_DELAY = 5.0
+
+
+class _Pool:
+    """Sandbox workers for one configuration; forked lazily on first use."""
+
+    def __init__(self, size: int, mem_limit_mb: int, problems: Dict[str, Dict[str, Any]]) -> None:
+        self.size = size
+        self.mem_limit_mb = mem_limit_mb
+        # Problems registered with the pool. Workers receive this dict through
+        # fork, so registering costs no IPC and no unpickling.
+        self.problems = dict(problems)
+        self._idle: "queue.Queue[Optional[_Worker]]" = queue.Queue()
+        # Used workers waiting to be reaped and replaced by the replenisher thread;
+        # None asks it for one more worker without reaping any
+        self._used: "queue.Queue[Optional[_Worker]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+
+    def _spawn(self) -> None:
+        # Forking under the lock means no worker outlives close()
+        with self._lock:
+            if not self._closed:
+                self._idle.put(_Worker(self.mem_limit_mb, self.problems))
+
+    def acquire(self, timeout: float) -> Optional[_Worker]:
+        """Take an idle worker; None if none is free within ``timeout`` or the pool was stopped."""
+        with self._lock:
+            if self._closed:
+                return None
+            if not self._started:
+                # The replenisher forks the initial workers too, so a failed fork
+                # is retried there instead of leaving the pool empty
+                threading.Thread(target=self._replenish, daemon=True).start()
+                self._started = True
+                for _ in range(self.size):
+                    self._used.put(None)
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if worker is None:
+            # Stopped while waiting; pass the wake-up on to the next waiter
+            self._idle.put(None)
+        return worker
+
+    def retire(self, worker: _Worker) -> None:
+        # Reaping and forking the replacement happen off the request path
+        with self._lock:
+            if not self._closed:
+                self._used.put(worker)
+                return
+        worker.kill()
+
+    def _replenish(self) -> None:
+        while True:
+            worker = self._used.get()
+            if worker is _STOP:
+                return
+            if worker is not None:
+                worker.kill()
+            delay = 0.1
+            while True:
+                try:
+                    self._spawn()
+                    break
+                except Exception:  # noqa: BLE001
+                    # e.g. EAGAIN from fork at the process limit. Runs that find no
+                    # idle worker meanwhile fall back to a fresh process.
+                    time.sleep(delay)
+                    delay = min(delay * 2, _MAX_RESPAWN_DELAY)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+        self._used.put(_STOP)
+        # Busy workers are killed when they are retired
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not None:
+                worker.kill()
+        self._idle.put(None)
+
+    def job_payload(self, problem: Dict[str, Any], code_obj: CodeType) -> Tuple[Any, bytes]:
+        # Registered problems go by id; anything else is sent in full. The code
+        # goes already compiled, so the worker does not parse it a second time.
+        code = marshal.dumps(code_obj)
+        if self.problems.get(problem.get("id")) is problem:
+            return problem["id"], code
+        return problem, code
+
+
+_pool: Optional[_Pool] = None
+
+
+def configure_pool(
+    size: Optional[int] = None,
+    mem_limit_mb: int = 128,
+    problems: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> None:
+    """Grade through ``size`` pre-forked sandbox workers (default: one per CPU).
+
+    Nothing is forked until the first submission is graded, so importing or
+    configuring an app costs no processes. Any previously configured pool is
+    stopped. ``problems`` (id -> problem) are registered with every worker up
+    front, so jobs for them only carry the problem id. Calls with a different
+    ``mem_limit_mb``, made without a pool, or that find no idle worker within
+    their time limit fall back to a fresh process per run.
+    """
+    global _pool
+    old, _pool = _pool, _Pool(size or os.cpu_count() or 1, mem_limit_mb, problems or {})
+    if old is not None:
+        old.close()
+
+
+def stop_pool() -> None:
+    """Kill the pool's workers; later runs fork a fresh process each."""
+    global _pool
+    old, _pool = _pool, None
+    if old is not None:
+        old.close()
+
+
+# Before multiprocessing's own exit hook, so no worker is forked after it has run
+atexit.register(stop_pool)
+
+
+def _dispatch(pool: _Pool, payload: Tuple[Any, bytes], timeout: float) -> Optional[_Worker]:
+    # A worker that died while idle only shows up as a broken pipe on send; the
+    # job then goes to the next worker. None means grade in a fresh process.
+    for _ in range(pool.size + 1):
+        worker = pool.acquire(timeout)
+        if worker is None:
+            return None
+        try:
+            worker.jobs.send(payload)
+            return worker
+        except OSError:
+            pool.retire(worker)
+    return None
+
+
+def _run_in_pool(pool: _Pool, jobs: List[_Compiled], time_limit: float, deadline: float) -> List[Dict[str, Any]]:
+    # Workers are single-use. The sandbox is porous enough (e.g. getattr on
+    # builtins) that code can patch the worker's own grader, so a process never
+    # grades a second submission. This keeps fork-per-submission isolation and
+    # still saves the fork latency on the request path, but not its CPU cost.
+    results: List[Any] = [None] * len(jobs)
+    # Jobs in flight, one per worker: result pipe -> (job index, worker, end time)
+    running: Dict[Connection, Tuple[int, _Worker, float]] = {}
+    started = 0
+    try:
+        while started < len(jobs) or running:
+            while started < len(jobs):
+                if time.monotonic() >= deadline:
+                    for i in range(started, len(jobs)):
+                        results[i] = dict(_NOT_STARTED)
+                    started = len(jobs)
+                    break
+                problem, code_obj = jobs[started]
+                # With jobs in flight only an idle worker will do. Otherwise wait, but
+                # not longer than the run itself may take: a fresh fork is quicker.
+                worker = _dispatch(pool, pool.job_payload(problem, code_obj), 0 if running else time_limit)
+                if worker is not None:
+                    running[worker.results] = (started, worker, time.monotonic() + time_limit)
+                elif running:
+                    break
+                else:
+                    results[started] = _run_once(problem, code_obj, time_limit, pool.mem_limit_mb)
+                started += 1
+            if not running:
+                continue
+
+            timeout = min(end for _, _, end in running.values()) - time.monotonic()
+            if started < len(jobs):
+                # Jobs still queued: look again soon for a worker replaced meanwhile
+                timeout = min(timeout, _BATCH_POLL_INTERVAL)
+            ready = wait(list(running), max(0.0, timeout))
+            now = time.monotonic()
+            for conn, (i, worker, end) in list(running.items()):
+                if conn in ready:
+                    try:
+                        results[i] = _recv_result(conn)
+                    except (EOFError, OSError):
+                        # Worker died mid-job (CPU or memory limit)
+                        results[i] = {"status": "error", "error": "No result returned"}
+                elif now >= end:
+                    worker.proc.kill()
+                    results[i] = {"status": "tle", "error": "Time Limit Exceeded"}
+                else:
+                    continue
+                del running[conn]
+                pool.retire(worker)
+    finally:
+        for _, worker, _ in running.values():
+            worker.proc.kill()
+            pool.retire(worker)
+    return results
+
+
+def _run_once(problem: Dict[str, Any], code_obj: CodeType, time_limit: float, mem_limit_mb: int) -> Dict[str, Any]:
+    read_fd, write_fd = os.pipe()
+    # A bare fork: the child already has grader and the problem bank loaded
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            _execute(problem, code_obj, mem_limit_mb, Connection(write_fd, readable=False))
+        finally:
+            os._exit(0)
+
+    os.close(write_fd)
+    reader = Connection(read_fd, writable=False)
+    try:
+        # Readable once the child has written its result or exited without one
+        if not reader.poll(time_limit):
+            os.kill(pid, signal.SIGKILL)
+            return {"status": "tle", "error": "Time Limit Exceeded"}
+        try:
+            result = _recv_result(reader)
+        except EOFError:
+            result = {"status": "error", "error": "No result returned"}
+    finally:
+        reader.close()
+        os.waitpid(pid, 0)
+    return result
+
+
+# How often a batch with queued jobs checks for a newly idle worker (seconds)
+_BATCH_POLL_INTERVAL = 0.02
+
+# Batch jobs still waiting to start when the batch time limit runs out
+_NOT_STARTED: Dict[str, Any] = {"status": "skipped", "error": "Not run: the batch time limit was reached"}
+
+
+def _precheck(code: str) -> Union[CodeType, Dict[str, Any]]:
+    # Check and compile in the parent only: the verdict is cached here, rejected
+    # code never pays for a process start, and the child just runs the result.
+    try:
+        return _ensure_safe(code)
     except SecurityError as se:
-        out_q.put({"status": "error", "error": str(se)})
+        return {"status": "error", "error": str(se)}
     except Exception as e:  # noqa: BLE001
-        out_q.put({"status": "error", "error": f"ERROR: {type(e).__name__}: {e}"})
+        return {"status": "error", "error": f"ERROR: {type(e).__name__}: {e}"}
 
 
 def run_in_subprocess(problem: Dict[str, Any], code: str, time_limit: float = 2.0, mem_limit_mb: int = 128) -> Dict[str, Any]:
@@ -160,20 +638,35 @@ def run_in_subprocess(problem: Dict[str, Any], code: str, time_limit: float = 2.
     - {status: "error", error: str}
     - {status: "tle"}
     """
-    q: mp.Queue = mp.Queue()
-    proc = mp.Process(target=_execute, args=(problem, code, mem_limit_mb, q))
-    proc.start()
-    proc.join(timeout=time_limit)
+    return run_batch_in_subprocess([(problem, code)], time_limit, mem_limit_mb)[0]
 
-    if proc.is_alive():
-        try:
-            proc.terminate()
-        finally:
-            proc.join(0.1)
-        return {"status": "tle", "error": "Time Limit Exceeded"}
 
-    try:
-        result = q.get_nowait()
-    except queue.Empty:
-        result = {"status": "error", "error": "No result returned"}
-    return result
+def run_batch_in_subprocess(
+    jobs: List[Job],
+    time_limit: float = 2.0,
+    mem_limit_mb: int = 128,
+    batch_time_limit: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """Grade several (problem, code) jobs; results are returned in job order.
+
+    With a pool, jobs run concurrently, each on its own pre-forked worker.
+    ``time_limit`` applies to each job separately. Once ``batch_time_limit``
+    seconds have passed no further job is started; those jobs are reported
+    with status "skipped".
+    """
+    results: List[Any] = [_precheck(code) for _, code in jobs]
+    pending = [i for i, r in enumerate(results) if isinstance(r, CodeType)]
+    compiled: List[_Compiled] = [(jobs[i][0], results[i]) for i in pending]
+    deadline = time.monotonic() + (batch_time_limit if batch_time_limit is not None else float("inf"))
+
+    pool = _pool
+    if pool is not None and mem_limit_mb == pool.mem_limit_mb:
+        graded = _run_in_pool(pool, compiled, time_limit, deadline)
+    else:
+        graded = [
+            _run_once(*job, time_limit, mem_limit_mb) if time.monotonic() < deadline else dict(_NOT_STARTED)
+            for job in compiled
+        ]
+    for i, result in zip(pending, graded):
+        results[i] = result
+    return results
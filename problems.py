@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import hashlib
 from typing import Any, Dict, List, Optional
 
+import orjson
+from markupsafe import Markup
+
 
 # Problem bank
 # Each problem:
@@ -12,12 +16,40 @@ from typing import Any, Dict, List, Optional
 # - function_signature: str (e.g., "def two_sum(nums, target):")
 # - template_code: str
 # - tests: List[{"args": [...], "kwargs": {...}, "expected": Any | List[Any]}]
+#
+# _add_problem tags each test with "_cmp" for the grader:
+# 0 = got == expected, 1 = any of the expected list,
+# 2 = membership in the precomputed "_expected_set"
 
 
 PROBLEMS: Dict[str, Dict[str, Any]] = {}
 
 
+def _accepted_set(expected: List[Any]) -> Optional[frozenset]:
+    # Lists are stored as tuples so they hash; a literal tuple among the answers
+    # would then compare equal to a list, so such tests keep the linear scan
+    if any(isinstance(e, tuple) for e in expected):
+        return None
+    try:
+        return frozenset(tuple(e) if isinstance(e, list) else e for e in expected)
+    except TypeError:
+        return None
+
+
 def _add_problem(p: Dict[str, Any]) -> None:
+    # Content digest of the tests; result caches key on it so edited tests invalidate
+    p["_version"] = hashlib.blake2b(repr(p["tests"]).encode(), digest_size=8).hexdigest()
+    # Tests with several accepted answers get a set for O(1) checks in the grader
+    for t in p["tests"]:
+        expected = t.get("expected")
+        t["_cmp"] = 0
+        if isinstance(expected, list):
+            accepted = _accepted_set(expected)
+            if accepted is not None:
+                t["_expected_set"] = accepted
+                t["_cmp"] = 2
+            else:
+                t["_cmp"] = 1
     PROBLEMS[p["id"]] = p
 
 
@@ -106,25 +138,38 @@ _add_problem(
 )
 
 
-def list_problems() -> List[Dict[str, Any]]:
+def _project(pid: str, p: Dict[str, Any]) -> Dict[str, Any]:
     # Minimal projection for UI + embed all needed fields
-    items = []
-    for pid, p in PROBLEMS.items():
-        items.append(
-            {
-                "id": pid,
-                "title": p["title"],
-                "description": p["description"],
-                "function_name": p["function_name"],
-                "function_signature": p["function_signature"],
-                "template_code": p["template_code"],
-            }
-        )
-    # Keep stable ordering
-    items.sort(key=lambda x: x["id"]) 
-    return items
+    return {
+        "id": pid,
+        "title": p["title"],
+        "description": p["description"],
+        "function_name": p["function_name"],
+        "function_signature": p["function_signature"],
+        "template_code": p["template_code"],
+    }
+
+
+# The bank is static after import, so the UI projection and its JSON are built once
+# Keep stable ordering
+_PROBLEMS_LIST: List[Dict[str, Any]] = sorted(
+    (_project(pid, p) for pid, p in PROBLEMS.items()), key=lambda x: x["id"]
+)
+
+# Characters that could end the embedding <script> block or break it as JS source
+_SCRIPT_ESCAPES = {
+    ord("<"): "\\u003c",
+    ord(">"): "\\u003e",
+    ord("&"): "\\u0026",
+    ord("\u2028"): "\\u2028",
+    ord("\u2029"): "\\u2029",
+}
+PROBLEMS_JSON_HTMLSAFE = Markup(orjson.dumps(_PROBLEMS_LIST).decode().translate(_SCRIPT_ESCAPES))
+
+
+def list_problems() -> List[Dict[str, Any]]:
+    return _PROBLEMS_LIST
 
 
 def get_problem(pid: str) -> Optional[Dict[str, Any]]:
     return PROBLEMS.get(pid)
-
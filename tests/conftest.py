@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import grader  # noqa: E402
+from app import create_app  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config["TESTING"] = True
+    yield app
+    grader.stop_pool()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,49 @@
+import pytest
+
+
+def login(client, student_id="65001"):
+    return client.post("/login", data={"student_id": student_id})
+
+
+def test_login_sets_signed_cookie(client):
+    resp = login(client)
+    assert resp.status_code == 302
+    cookie = client.get_cookie("sid")
+    student_id, _, mac = cookie.value.rpartition(".")
+    assert student_id == "65001"
+    assert len(mac) == 32
+    assert client.get("/").status_code == 200
+
+
+def test_rejected_id_sets_no_cookie(client):
+    resp = login(client, "99")
+    assert "error=Invalid" in resp.headers["Location"]
+    assert client.get_cookie("sid") is None
+
+
+@pytest.mark.parametrize(
+    "tamper",
+    [
+        lambda sid, mac: f"65002.{mac}",
+        lambda sid, mac: f"{sid}.{mac[:-1]}{'0' if mac[-1] != '0' else '1'}",
+        lambda sid, mac: f"{sid}.",
+        lambda sid, mac: sid,
+        lambda sid, mac: f"{sid}.{mac[:-1]}é",  # non-ASCII MAC must not raise
+    ],
+    ids=["other-id", "flipped-mac", "empty-mac", "no-mac", "non-ascii-mac"],
+)
+def test_tampered_cookie_is_rejected(client, tamper):
+    login(client)
+    sid, _, mac = client.get_cookie("sid").value.rpartition(".")
+    client.set_cookie("sid", tamper(sid, mac))
+    resp = client.get("/")
+    assert resp.status_code == 302
+    assert resp.headers["Location"].startswith("/login?next=")
+
+
+def test_logout_clears_cookie(client):
+    login(client)
+    resp = client.get("/logout")
+    assert resp.status_code == 302
+    assert client.get_cookie("sid") is None
+    assert client.get("/").status_code == 302
@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+import grader
+from problems import PROBLEMS
+
+FIB = PROBLEMS["fibonacci"]
+GOOD = "def fib(n):\n    return n if n < 2 else fib(n - 1) + fib(n - 2)\n"
+LOOP = "def fib(n):\n    while True:\n        pass\n"
+
+
+@pytest.fixture
+def pool():
+    grader.configure_pool(4, mem_limit_mb=128, problems=PROBLEMS)
+    yield grader._pool
+    grader.stop_pool()
+
+
+def test_batch_jobs_run_concurrently(pool):
+    start = time.monotonic()
+    results = grader.run_batch_in_subprocess(
+        [(FIB, LOOP)] * 4 + [(FIB, GOOD)], time_limit=0.5, mem_limit_mb=128, batch_time_limit=5.0
+    )
+    # Back to back the four loops alone would take 2 s
+    assert time.monotonic() - start < 1.5
+    assert [r["status"] for r in results] == ["tle"] * 4 + ["ok"]
+
+
+@pytest.mark.parametrize("use_pool", [True, False])
+def test_jobs_after_batch_limit_are_skipped(use_pool, request):
+    if use_pool:
+        grader.configure_pool(1, mem_limit_mb=128, problems=PROBLEMS)
+    else:
+        grader.stop_pool()
+    request.addfinalizer(grader.stop_pool)
+    results = grader.run_batch_in_subprocess(
+        [(FIB, LOOP), (FIB, GOOD), (FIB, "import os")], time_limit=0.5, mem_limit_mb=128, batch_time_limit=0.2
+    )
+    assert results[0]["status"] == "tle"
+    assert results[1]["status"] == "skipped"
+    # Rejected before the batch starts, so never skipped
+    assert results[2] == {"status": "error", "error": "Import statements are not allowed"}
+
+
+def test_code_batch_is_limited_to_instructors(app, client):
+    client.post("/login", data={"student_id": "65001"})
+    batch = {"code_batch": [{"problem_id": "fibonacci", "code": GOOD}]}
+    assert client.post("/api/run", json=batch).status_code == 403
+
+    app.config["INSTRUCTOR_IDS"] = {"65001"}
+    resp = client.post("/api/run", json=batch)
+    assert resp.status_code == 200
+    assert [r["status"] for r in resp.get_json()["results"]] == ["ok"]
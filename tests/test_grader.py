@@ -0,0 +1,77 @@
+import pytest
+
+import grader
+import problems
+
+ECHO = grader._ensure_safe("def echo(x):\n    return x\n")
+
+
+def make_problem(expected, tag=True):
+    p = {"id": "echo", "function_name": "echo", "tests": [{"args": [None], "kwargs": {}, "expected": expected}]}
+    if tag:
+        problems._add_problem(p)
+    return p
+
+
+def check(problem, got):
+    problem["tests"][0]["args"] = [got]
+    result = grader._grade(problem, ECHO)
+    assert result["status"] == "ok"
+    (item,) = result["tests"]
+    assert item["error"] is None
+    return item["ok"]
+
+
+@pytest.fixture(autouse=True)
+def scratch_bank(monkeypatch):
+    monkeypatch.setattr(problems, "PROBLEMS", {})
+
+
+def test_single_answer_compares_equal():
+    p = make_problem(5)
+    assert p["tests"][0]["_cmp"] == 0
+    assert check(p, 5)
+    assert not check(p, 6)
+    assert not check(p, [5])
+
+
+def test_answer_set_accepts_list_result():
+    p = make_problem([[0, 1], [1, 0]])
+    assert p["tests"][0]["_cmp"] == 2
+    assert check(p, [1, 0])
+    assert not check(p, [1, 1])
+
+
+def test_answer_set_does_not_match_tuple_result():
+    # (0, 1) hashes like the stored [0, 1] but is not equal to it
+    p = make_problem([[0, 1], [1, 0]])
+    assert not check(p, (0, 1))
+
+
+@pytest.mark.parametrize("got", [[[0, 1]], {"a": 1}, [{}]])
+def test_answer_set_handles_unhashable_result(got):
+    p = make_problem([[0, 1], [1, 0]])
+    assert not check(p, got)
+
+
+def test_tuple_answer_uses_linear_scan():
+    p = make_problem([(0, 1), [1, 0]])
+    assert p["tests"][0]["_cmp"] == 1
+    assert check(p, (0, 1))
+    assert check(p, [1, 0])
+    assert not check(p, [0, 1])
+
+
+def test_unhashable_answers_use_linear_scan():
+    p = make_problem([{"a": 1}, {"b": 2}])
+    assert p["tests"][0]["_cmp"] == 1
+    assert check(p, {"b": 2})
+    assert not check(p, {"c": 3})
+
+
+def test_untagged_tests_still_grade():
+    p = make_problem([[0, 1], [1, 0]], tag=False)
+    assert "_cmp" not in p["tests"][0]
+    assert check(p, [0, 1])
+    assert not check(p, (0, 1))
+    assert check(make_problem(5, tag=False), 5)
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+import grader
+from problems import PROBLEMS
+
+FIB = PROBLEMS["fibonacci"]
+GOOD = "def fib(n):\n    return n if n < 2 else fib(n - 1) + fib(n - 2)\n"
+LOOP = "def fib(n):\n    while True:\n        pass\n"
+
+
+@pytest.fixture
+def pool():
+    grader.configure_pool(2, mem_limit_mb=128, problems=PROBLEMS)
+    yield grader._pool
+    grader.stop_pool()
+
+
+def fail_fallback(*args, **kwargs):
+    raise AssertionError("graded in a fresh process instead of the pool")
+
+
+@pytest.fixture
+def no_fallback(monkeypatch):
+    monkeypatch.setattr(grader, "_run_once", fail_fallback)
+
+
+def wait_idle(pool, count=1, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while pool._idle.qsize() < count:
+        assert time.monotonic() < deadline, "pool did not refill"
+        time.sleep(0.01)
+
+
+def test_pool_grades_submission(pool, no_fallback):
+    result = grader.run_in_subprocess(FIB, GOOD, time_limit=2.0, mem_limit_mb=128)
+    assert result["status"] == "ok"
+    assert result["summary"]["passed"] == result["summary"]["total"]
+
+
+def test_pool_tle_replaces_worker(pool, no_fallback):
+    result = grader.run_in_subprocess(FIB, LOOP, time_limit=0.3, mem_limit_mb=128)
+    assert result == {"status": "tle", "error": "Time Limit Exceeded"}
+    wait_idle(pool, pool.size)
+    assert grader.run_in_subprocess(FIB, GOOD, time_limit=2.0, mem_limit_mb=128)["status"] == "ok"
+
+
+def test_dead_idle_worker_is_skipped(pool, no_fallback):
+    grader.run_in_subprocess(FIB, GOOD, time_limit=2.0, mem_limit_mb=128)
+    wait_idle(pool, pool.size)
+    for worker in list(pool._idle.queue):
+        worker.proc.kill()
+        worker.proc.join()
+    result = grader.run_in_subprocess(FIB, GOOD, time_limit=2.0, mem_limit_mb=128)
+    assert result["status"] == "ok"
+
+
+def test_fork_failure_falls_back_and_recovers(pool, monkeypatch):
+    def fail_fork(self, *args, **kwargs):
+        raise BlockingIOError(11, "Resource temporarily unavailable")
+
+    real_init = grader._Worker.__init__
+    monkeypatch.setattr(grader._Worker, "__init__", fail_fork)
+    # First use: no worker can be forked, so the run goes to a fresh process
+    result = grader.run_in_subprocess(FIB, GOOD, time_limit=0.5, mem_limit_mb=128)
+    assert result["status"] == "ok"
+    assert pool._idle.qsize() == 0
+
+    monkeypatch.setattr(grader._Worker, "__init__", real_init)
+    wait_idle(pool, pool.size)
+    monkeypatch.setattr(grader, "_run_once", fail_fallback)
+    assert grader.run_in_subprocess(FIB, GOOD, time_limit=2.0, mem_limit_mb=128)["status"] == "ok"
+
+
+def test_stopped_pool_falls_back(pool):
+    grader.stop_pool()
+    result = grader.run_in_subprocess(FIB, GOOD, time_limit=2.0, mem_limit_mb=128)
+    assert result["status"] == "ok"
@@ -0,0 +1,74 @@
+import pytest
+
+import grader
+import problems
+from problems import PROBLEMS
+
+GOOD = "def fib(n):\n    return n if n < 2 else fib(n - 1) + fib(n - 2)\n"
+LOOP = "def fib(n):\n    while True:\n        pass\n"
+
+
+@pytest.fixture
+def graded(client, monkeypatch):
+    """Log in and count the submissions that actually reach the grader."""
+    client.post("/login", data={"student_id": "65001"})
+    calls = []
+    run = grader.run_in_subprocess
+
+    def counting_run(problem, code, **kwargs):
+        calls.append(code)
+        return run(problem, code, **kwargs)
+
+    monkeypatch.setattr(grader, "run_in_subprocess", counting_run)
+    return calls
+
+
+def submit(client, code, problem_id="fibonacci"):
+    return client.post("/api/run", json={"problem_id": problem_id, "code": code})
+
+
+def test_identical_submission_is_served_from_cache(client, graded):
+    first = submit(client, GOOD)
+    second = submit(client, GOOD)
+    assert first.status_code == second.status_code == 200
+    assert second.get_data() == first.get_data()
+    assert len(graded) == 1
+
+
+def test_changed_source_is_graded_again(client, graded):
+    submit(client, GOOD)
+    submit(client, GOOD + "\n")
+    assert len(graded) == 2
+
+
+def test_new_problem_version_invalidates_cache(client, graded, monkeypatch):
+    submit(client, GOOD)
+    monkeypatch.setitem(PROBLEMS["fibonacci"], "_version", "edited-tests")
+    submit(client, GOOD)
+    assert len(graded) == 2
+
+
+def test_version_follows_test_content(monkeypatch):
+    monkeypatch.setattr(problems, "PROBLEMS", {})
+
+    def version(expected):
+        p = {"id": "p", "tests": [{"args": [1], "kwargs": {}, "expected": expected}]}
+        problems._add_problem(p)
+        return p["_version"]
+
+    assert version(1) == version(1)
+    assert version(1) != version(2)
+
+
+def test_timeouts_are_not_cached(app, client, graded):
+    app.config["GRADER_TIME_LIMIT"] = 0.3
+    assert submit(client, LOOP).get_json()["status"] == "tle"
+    assert submit(client, LOOP).get_json()["status"] == "tle"
+    assert len(graded) == 2
+
+
+def test_large_bodies_are_not_cached(app, client, graded):
+    app.config["GRADER_RESULT_CACHE_MAX_BODY"] = 16
+    submit(client, GOOD)
+    submit(client, GOOD)
+    assert len(graded) == 2